@@ -1,10 +1,31 @@
-from setuptools import setup, find_packages
+import platform
+
+from setuptools import Extension, setup, find_packages
 
 install_requires = [
+    'futures; python_version < "3"',
     'needle',
-    'pasteDeploy'
+    'numpy',
+    'pasteDeploy',
 ]
 
+sad_compile_args = ['-O3']
+if platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686'):
+    sad_compile_args.append('-msse2')
+
+# Optional: stitching._diff_kernel falls back to numba or NumPy when the
+# extension cannot be built.
+ext_modules = [
+    Extension('stitching._sad',
+              ['stitching/_sad.c'],
+              extra_compile_args=sad_compile_args,
+              optional=True),
+]
+
+extras_require = {
+    'numba': ['numba'],
+}
+
 setup(name='stitching',
       version=0.1,
       description='Isolated visual testing',
@@ -17,4 +38,6 @@ setup(name='stitching',
       packages=find_packages(),
       include_package_data=True,
       zip_safe=False,
-      install_requires=install_requires, )
+      install_requires=install_requires,
+      extras_require=extras_require,
+      ext_modules=ext_modules, )
@@ -0,0 +1,52 @@
+"""
+Compiled kernels used to compare screenshots.
+
+:func:`sad` is the C extension from ``stitching/_sad.c`` when it has been built;
+it picks its AVX2 or SSE2 kernel itself based on the running CPU. The
+extension build is optional; without it a Numba compiled kernel is used when
+numba is installed, and plain NumPy otherwise.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+
+
+def _sad_numpy(a, b):
+    """
+    Return the sum of absolute differences between two equally sized flat
+    uint8 arrays.
+    """
+    return int(np.abs(a.astype(np.int16) - b).sum())
+
+
+def _make_sad_numba():
+    """
+    Return a Numba compiled SAD kernel, or None if numba is not installed.
+    """
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+
+    # Not parallel: checks already run concurrently from a thread pool and
+    # Numba's default workqueue threading layer does not support concurrent
+    # launches.
+    @njit(nogil=True, fastmath=True, cache=True)
+    def sad_numba(a, b):
+        total = 0
+        for i in range(a.shape[0]):
+            # Widen before subtracting, uint8 arithmetic would wrap around.
+            total += abs(np.int64(a[i]) - np.int64(b[i]))
+        return total
+
+    return sad_numba
+
+
+try:
+    from stitching import _sad
+except ImportError:
+    # The extension is not built, e.g. no C compiler was available at install
+    # time or when running from a source checkout.
+    sad = _make_sad_numba() or _sad_numpy
+else:
+    sad = _sad.sad
@@ -0,0 +1,240 @@
+/*
+ * Sum of absolute differences (SAD) between two byte buffers.
+ *
+ * The SSE2 PSADBW instruction (_mm_sad_epu8) sums the absolute differences of
+ * 16 byte pairs into two 64 bit lanes in a single instruction, which makes it
+ * a direct fit for comparing uint8 screenshot buffers. When the compiler
+ * supports it an AVX2 variant (_mm256_sad_epu8, 32 bytes per instruction) is
+ * also built. It is compiled with a per function target attribute, so the rest
+ * of the module stays runnable on CPUs without AVX2, and sad() switches to it
+ * when the CPU supports AVX2, detected once at import time.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+
+#ifdef __SSE2__
+#include <emmintrin.h>
+#endif
+
+#if (defined(__GNUC__) || defined(__clang__)) && \
+    (defined(__x86_64__) || defined(__i386__))
+#define HAVE_SAD_AVX2 1
+#include <immintrin.h>
+#endif
+
+static uint64_t
+sad_scalar(const uint8_t *a, const uint8_t *b, Py_ssize_t n)
+{
+    uint64_t total = 0;
+    Py_ssize_t i;
+
+    for (i = 0; i < n; i++) {
+        total += a[i] > b[i] ? a[i] - b[i] : b[i] - a[i];
+    }
+    return total;
+}
+
+#ifdef __SSE2__
+static uint64_t
+sad_sse2(const uint8_t *a, const uint8_t *b, Py_ssize_t n)
+{
+    __m128i acc = _mm_setzero_si128();
+    uint64_t lanes[2];
+    Py_ssize_t i = 0;
+
+    /* Unrolled x2, 32 bytes per iteration. */
+    for (; i + 32 <= n; i += 32) {
+        __m128i a0 = _mm_loadu_si128((const __m128i *)(a + i));
+        __m128i b0 = _mm_loadu_si128((const __m128i *)(b + i));
+        __m128i a1 = _mm_loadu_si128((const __m128i *)(a + i + 16));
+        __m128i b1 = _mm_loadu_si128((const __m128i *)(b + i + 16));
+        acc = _mm_add_epi64(acc, _mm_sad_epu8(a0, b0));
+        acc = _mm_add_epi64(acc, _mm_sad_epu8(a1, b1));
+    }
+    for (; i + 16 <= n; i += 16) {
+        __m128i a0 = _mm_loadu_si128((const __m128i *)(a + i));
+        __m128i b0 = _mm_loadu_si128((const __m128i *)(b + i));
+        acc = _mm_add_epi64(acc, _mm_sad_epu8(a0, b0));
+    }
+
+    _mm_storeu_si128((__m128i *)lanes, acc);
+    return lanes[0] + lanes[1] + sad_scalar(a + i, b + i, n - i);
+}
+#endif
+
+#ifdef HAVE_SAD_AVX2
+__attribute__((target("avx2")))
+static uint64_t
+sad_avx2(const uint8_t *a, const uint8_t *b, Py_ssize_t n)
+{
+    __m256i acc = _mm256_setzero_si256();
+    __m128i acc128;
+    uint64_t lanes[2];
+    Py_ssize_t i = 0;
+
+    /* Unrolled x2, 64 bytes per iteration. */
+    for (; i + 64 <= n; i += 64) {
+        __m256i a0 = _mm256_loadu_si256((const __m256i *)(a + i));
+        __m256i b0 = _mm256_loadu_si256((const __m256i *)(b + i));
+        __m256i a1 = _mm256_loadu_si256((const __m256i *)(a + i + 32));
+        __m256i b1 = _mm256_loadu_si256((const __m256i *)(b + i + 32));
+        acc = _mm256_add_epi64(acc, _mm256_sad_epu8(a0, b0));
+        acc = _mm256_add_epi64(acc, _mm256_sad_epu8(a1, b1));
+    }
+    for (; i + 32 <= n; i += 32) {
+        __m256i a0 = _mm256_loadu_si256((const __m256i *)(a + i));
+        __m256i b0 = _mm256_loadu_si256((const __m256i *)(b + i));
+        acc = _mm256_add_epi64(acc, _mm256_sad_epu8(a0, b0));
+    }
+
+    acc128 = _mm_add_epi64(_mm256_castsi256_si128(acc),
+                           _mm256_extracti128_si256(acc, 1));
+    _mm_storeu_si128((__m128i *)lanes, acc128);
+    return lanes[0] + lanes[1] + sad_scalar(a + i, b + i, n - i);
+}
+#endif
+
+#if PY_MAJOR_VERSION >= 3
+#define BUFFER_FORMAT "y*y*:sad"
+#else
+#define BUFFER_FORMAT "s*s*:sad"
+#endif
+
+typedef uint64_t (*sad_func)(const uint8_t *, const uint8_t *, Py_ssize_t);
+
+static PyObject *
+call_sad(PyObject *args, sad_func func)
+{
+    Py_buffer a, b;
+    uint64_t total;
+
+    if (!PyArg_ParseTuple(args, BUFFER_FORMAT, &a, &b)) {
+        return NULL;
+    }
+    if (a.len != b.len) {
+        PyBuffer_Release(&a);
+        PyBuffer_Release(&b);
+        PyErr_SetString(PyExc_ValueError, "buffers must be the same size");
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    total = func((const uint8_t *)a.buf, (const uint8_t *)b.buf, a.len);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&a);
+    PyBuffer_Release(&b);
+    return PyLong_FromUnsignedLongLong(total);
+}
+
+/* Set to the fastest kernel the CPU supports by init_best_sad(). */
+#ifdef __SSE2__
+static sad_func best_sad = sad_sse2;
+#else
+static sad_func best_sad = sad_scalar;
+#endif
+static int have_avx2 = 0;
+
+static void
+init_best_sad(void)
+{
+#ifdef HAVE_SAD_AVX2
+    __builtin_cpu_init();
+    if (__builtin_cpu_supports("avx2")) {
+        have_avx2 = 1;
+        best_sad = sad_avx2;
+    }
+#endif
+}
+
+PyDoc_STRVAR(sad_doc,
+"sad(a, b) -> int\n\n"
+"Return the sum of absolute differences between two equally sized\n"
+"contiguous byte buffers, using AVX2 when the CPU supports it.");
+
+static PyObject *
+sad(PyObject *self, PyObject *args)
+{
+    return call_sad(args, best_sad);
+}
+
+#ifdef __SSE2__
+PyDoc_STRVAR(sad_sse2_doc,
+"sad_sse2(a, b) -> int\n\n"
+"SSE2 variant of sad, regardless of AVX2 support.");
+
+static PyObject *
+sad_sse2_py(PyObject *self, PyObject *args)
+{
+    return call_sad(args, sad_sse2);
+}
+#endif
+
+#ifdef HAVE_SAD_AVX2
+PyDoc_STRVAR(sad_avx2_doc,
+"sad_avx2(a, b) -> int\n\n"
+"AVX2 variant of sad. Raises RuntimeError when the CPU does not support\n"
+"AVX2 (see HAVE_AVX2).");
+
+static PyObject *
+sad_avx2_py(PyObject *self, PyObject *args)
+{
+    if (!have_avx2) {
+        PyErr_SetString(PyExc_RuntimeError, "CPU does not support AVX2");
+        return NULL;
+    }
+    return call_sad(args, sad_avx2);
+}
+#endif
+
+static PyMethodDef sad_methods[] = {
+    {"sad", sad, METH_VARARGS, sad_doc},
+#ifdef __SSE2__
+    {"sad_sse2", sad_sse2_py, METH_VARARGS, sad_sse2_doc},
+#endif
+#ifdef HAVE_SAD_AVX2
+    {"sad_avx2", sad_avx2_py, METH_VARARGS, sad_avx2_doc},
+#endif
+    {NULL, NULL, 0, NULL}
+};
+
+#if PY_MAJOR_VERSION >= 3
+static struct PyModuleDef sad_module = {
+    PyModuleDef_HEAD_INIT,
+    "_sad",
+    "Sum of absolute differences kernels.",
+    -1,
+    sad_methods
+};
+
+PyMODINIT_FUNC
+PyInit__sad(void)
+{
+    PyObject *module;
+
+    init_best_sad();
+    module = PyModule_Create(&sad_module);
+    if (module == NULL) {
+        return NULL;
+    }
+    if (PyModule_AddIntConstant(module, "HAVE_AVX2", have_avx2) < 0) {
+        Py_DECREF(module);
+        return NULL;
+    }
+    return module;
+}
+#else
+PyMODINIT_FUNC
+init_sad(void)
+{
+    PyObject *module;
+
+    init_best_sad();
+    module = Py_InitModule3(
+        "_sad", sad_methods, "Sum of absolute differences kernels.");
+    if (module != NULL) {
+        PyModule_AddIntConstant(module, "HAVE_AVX2", have_avx2);
+    }
+}
+#endif
@@ -71,7 +71,10 @@ Config sections:
     to generate baseline screenshots. No assertions happen if this is set to
     true.
   * screenshot_dir - Directory where baseline screenshots will be
-    saved/loaded to/from.
+    saved/loaded to/from. Decoded baseline pixels are cached as uncompressed
+    `.npy` files under its `cache` folder, and failing screenshots are saved
+    under its `errors` folder. Only the `baseline` folder needs to be kept
+    under version control; add the others to your ignore file.
 
 * selenium:display_{key}
   * width - Pixel width to set the browser to before taking the screenshot.
@@ -85,55 +88,168 @@ Config sections:
     browser
   * mobile - Boolean indicating if the browser should emulate a mobile device.
 
+Pillow-SIMD:
+Screenshot decoding and conversion go through PIL. pillow-simd is a drop in
+replacement for pillow with SIMD accelerated versions of those operations. It
+is not a dependency because needle requires pillow and both ship the PIL
+package. To use it, swap it in after installing this package (releases before
+7.0 still support Python 2):
+
+.. code:: sh
+
+    pip uninstall -y pillow
+    pip install 'pillow-simd<7'
+
+Reinstalling or upgrading needle will bring pillow back, so repeat the swap
+afterwards.
+
 """
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import logging
 import os
+import re
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ConfigParser import SafeConfigParser
 from importlib import import_module
+from io import BytesIO
 from itertools import product
-from time import sleep
 
-from PIL import Image
-from needle.driver import NeedleRemote
-from needle.engines.pil_engine import ImageDiff
 from paste.deploy.converters import asbool, aslist
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.remote_connection import LOGGER
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 
 from stitching.exceptions import AssertScreenshotException, InvalidBrowserException, MissingBaselineScreenshotException
 
 LOGGER.setLevel(logging.WARNING)
 log = logging.getLogger(__name__)
 
+# Parsed selenium settings keyed by absolute config file path and the class
+# attributes that select the config sections. Shared by all test case classes
+# so the config is only read once per test run.
+_CONFIG_CACHE = {}
+
+# Matches the "<mtime>-<size>.npy" stamp that follows a baseline pixel cache
+# prefix, see SeleniumRegressionTestCase._load_baseline.
+_CACHE_STAMP_RE = re.compile(r'^\.\d+\.\d{6}-\d+\.npy$')
+
 
 class SeleniumRegressionTestCase(unittest.TestCase):
     _APP_CONFIG_SECTION = 'myapp'
+    _CHROME_BROWSER_KEYS = frozenset(('chrome', 'chrome_mobile'))
     _BASELINE_FOLDER_NAME = 'baseline'
+    _CACHE_FOLDER_NAME = 'cache'
     _ERROR_FOLDER_NAME = 'errors'
     _CONFIG_FILE = 'example.ini'
+    _ELEMENT_WAIT_TIMEOUT = 5
     _SELENIUM_CONFIG_BROWSER_PREFIX = 'browser_'
     _SELENIUM_CONFIG_DISPLAY_PREFIX = 'display_'
     _SELENIUM_CONFIG_SECTION = 'selenium'
     _THRESHOLD = 0
+    _TILE_SIZE = 64
 
     @classmethod
     def setUpClass(cls):
         """
         Load config files.
 
-        Use :func:`SeleniumRegressionTestCase._parse_selenium_config` to parse and store values found in the config
-        file that is specified by the `_CONFIG_FILE` class member.
+        Use :func:`SeleniumRegressionTestCase._parse_selenium_config` to parse values found in the config file that
+        is specified by the `_CONFIG_FILE` class member and store them on the class. Parsed settings are cached per
+        config file path and section names so that subsequent test case classes do not re-read the file.
         """
-        cwd = os.getcwd()
-        config = SafeConfigParser()
-        config.read('{}/{}'.format(
-            cwd,
-            cls._CONFIG_FILE))
+        path = os.path.abspath(os.path.join(os.getcwd(), cls._CONFIG_FILE))
+        cache_key = (
+            path,
+            cls._SELENIUM_CONFIG_SECTION,
+            cls._SELENIUM_CONFIG_BROWSER_PREFIX,
+            cls._SELENIUM_CONFIG_DISPLAY_PREFIX)
+        settings = _CONFIG_CACHE.get(cache_key)
+        if settings is None:
+            config = SafeConfigParser()
+            config.read(path)
+            settings = cls._parse_selenium_config(config)
+            _CONFIG_CACHE[cache_key] = settings
+
+        cls._selenium_settings = settings
+        cls._command_executor = settings['command_executor']
+        cls._base_url = settings['base_url']
+        cls._screenshot_dir = settings['screenshot_dir']
+        cls._make_baseline_screenshots = settings['make_baseline_screenshots']
+        cls._browsers = settings['browsers']
+        cls._displays = settings['displays']
+        cls._display_browser_pairs = list(
+            product(list(cls._displays), list(cls._browsers)))
+
+        # Build and create every screenshot directory up front so checks only
+        # need a dict lookup.
+        cls._screenshot_paths = {}
+        for display_name, browser_name in cls._display_browser_pairs:
+            for folder in (cls._BASELINE_FOLDER_NAME, cls._ERROR_FOLDER_NAME):
+                screenshot_path = cls._make_screenshot_path(
+                    cls._screenshot_dir, folder, browser_name, display_name)
+                try:
+                    os.makedirs(screenshot_path)
+                except OSError:
+                    # Another process may have created it concurrently.
+                    if not os.path.isdir(screenshot_path):
+                        raise
+                cls._screenshot_paths[
+                    (folder, browser_name, display_name)] = screenshot_path
+            # Created on demand, the cache is optional.
+            cls._screenshot_paths[
+                (cls._CACHE_FOLDER_NAME, browser_name, display_name)] = (
+                    cls._make_screenshot_path(
+                        cls._screenshot_dir, cls._CACHE_FOLDER_NAME,
+                        browser_name, display_name))
+
+        cls._caps_cache = {}
+        for display_name, browser_name in cls._display_browser_pairs:
+            if browser_name in cls._CHROME_BROWSER_KEYS:
+                options = cls._make_chrome_options(
+                    cls._browsers[browser_name], cls._displays[display_name])
+            else:
+                raise InvalidBrowserException(browser_name)
+            cls._caps_cache[(display_name, browser_name)] = (
+                options.to_capabilities())
+
+        cls._driver_pool = {}
+        try:
+            for display_name, browser_name, driver in cls._yield_drivers():
+                cls._driver_pool[(display_name, browser_name)] = driver
+        except Exception:
+            # tearDownClass is not called when setUpClass fails. Subclass
+            # overrides may expect state that does not exist yet, so only quit
+            # the drivers here.
+            cls._quit_drivers()
+            raise
 
-        cls._selenium_settings = cls._parse_selenium_config(config)
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Quit all web drivers created in
+        :func:`SeleniumRegressionTestCase.setUpClass`.
+        """
+        cls._quit_drivers()
+
+    @classmethod
+    def _quit_drivers(cls):
+        """
+        Quit every driver in the pool and empty it. A driver that fails to
+        quit is logged so the remaining sessions are still closed.
+        """
+        for (display_name, browser_name), driver in cls._driver_pool.items():
+            try:
+                driver.quit()
+            except Exception:
+                log.exception('Failed to quit driver for {} {}'.format(
+                    display_name, browser_name))
+        cls._driver_pool = {}
 
     def assertScreenshot(self, selector, path):
         """
@@ -147,61 +263,272 @@ class SeleniumRegressionTestCase(unittest.TestCase):
         :param unicode selector: CSS selector of element to screenshot.
         :param path: URL path to page where element is found.
         """
-        for display_name, browser_name, driver in self._yield_drivers():
-            url = self._make_url(path)
-            driver.get(url)
-
-            # selenium checks for a str instance. Unicode would fail here.
-            element = driver.find_element_by_css_selector(str(selector))
-            sleep(1)
-            screenshot = element.get_screenshot()
-
-            baseline_path = self._make_screenshot_path(
-                self._BASELINE_FOLDER_NAME,
-                browser_name,
-                display_name)
-
-            baseline_file = '{}/{}--{}.png'.format(
-                baseline_path,
-                path,
-                selector)
-            # Create the directory if it does not exist.
-            if not os.path.exists(baseline_path):
-                os.makedirs(baseline_path)
-
-            if self._make_baseline_screenshots:
-                screenshot.save(baseline_file)
-                log.warning('Creating baseline screenshot: {}'.format(
-                    baseline_file))
+        # selenium checks for a str instance. Unicode would fail here.
+        locator = (By.CSS_SELECTOR, str(selector))
+        drivers = self._driver_pool.items()
+        executor = ThreadPoolExecutor(max_workers=len(drivers) or 1)
+        try:
+            futures = [
+                executor.submit(
+                    self._check_one,
+                    display_name,
+                    browser_name,
+                    driver,
+                    selector,
+                    locator,
+                    path)
+                for (display_name, browser_name), driver in drivers]
+
+            # Re-raises the first exception raised by a check.
+            for future in as_completed(futures):
+                future.result()
+        finally:
+            executor.shutdown(wait=True)
+
+    def _check_one(self, display_name, browser_name, driver, selector, locator, path):
+        """
+        Screenshot the element as defined by the passed CSS `selector` using a
+        single driver and compare it with the baseline screenshot (or save it
+        as the baseline). The driver session is reused by later checks so it is
+        left open.
+
+        :param unicode display_name: The name of the display the driver was set up for.
+        :param unicode browser_name: The name of the browser the driver was set up for.
+        :param driver: Web driver to take the screenshot with.
+        :param unicode selector: CSS selector of element to screenshot.
+        :param tuple locator: Selenium (By, value) locator for `selector`.
+        :param path: URL path to page where element is found.
+        """
+        import numpy as np
+
+        url = self._make_url(path)
+        driver.get(url)
+
+        element = WebDriverWait(driver, self._ELEMENT_WAIT_TIMEOUT).until(
+            EC.visibility_of_element_located(locator))
+
+        baseline_path = self._screenshot_paths[
+            (self._BASELINE_FOLDER_NAME, browser_name, display_name)]
+
+        baseline_file = '{}/{}--{}.png'.format(
+            baseline_path,
+            path,
+            selector)
+
+        cache_path = self._screenshot_paths[
+            (self._CACHE_FOLDER_NAME, browser_name, display_name)]
+
+        # The cache file name adds a stamp of the baseline PNG to this prefix.
+        cache_prefix = '{}/{}--{}.png'.format(
+            cache_path,
+            path,
+            selector)
+
+        if self._make_baseline_screenshots:
+            png_bytes = self._get_element_png(element)
+            if png_bytes is not None:
+                # Write selenium's PNG as is rather than decoding and
+                # re-encoding it.
+                with open(baseline_file, 'wb') as f:
+                    f.write(png_bytes)
             else:
-                try:
-                    baseline_screenshot = Image.open(baseline_file).convert('RGB')
-                except IOError:
-                    raise MissingBaselineScreenshotException
+                # Baselines are written once and kept, so spend the time on a
+                # smaller file.
+                element.get_screenshot().save(
+                    baseline_file, format='PNG', compress_level=9,
+                    optimize=True)
+            # The decoded pixel cache is rebuilt on the next comparison.
+            self._remove_baseline_caches(cache_prefix)
+            log.warning('Creating baseline screenshot: {}'.format(
+                baseline_file))
+            return
+
+        screenshot = element.get_screenshot()
+        screenshot_array = np.asarray(screenshot.convert('RGB'))
+        baseline_array = self._load_baseline(baseline_file, cache_prefix)
+
+        # Byte-identical images need no diff. Comparing equally sized bytes
+        # objects is a single memcmp.
+        if (screenshot_array.shape == baseline_array.shape and
+                screenshot_array.tobytes() == baseline_array.tobytes()):
+            return
+
+        error_path = self._screenshot_paths[
+            (self._ERROR_FOLDER_NAME, browser_name, display_name)]
+
+        error_file = '{}/{}--{}.png'.format(
+            error_path,
+            path,
+            selector)
+        # Error screenshots are transient, favour write speed over size.
+        if screenshot_array.shape != baseline_array.shape:
+            screenshot.save(
+                error_file, format='PNG', compress_level=1, optimize=False)
+            raise AssertScreenshotException(error_file)
+
+        distance = self._get_distance(screenshot_array, baseline_array)
+        if distance > self._THRESHOLD:
+            screenshot.save(
+                error_file, format='PNG', compress_level=1, optimize=False)
+            raise AssertScreenshotException(distance)
 
-                error_path = self._make_screenshot_path(
-                    self._ERROR_FOLDER_NAME,
-                    browser_name,
-                    display_name)
+    @staticmethod
+    def _get_element_png(element):
+        """
+        Return the PNG bytes of selenium's own screenshot of `element`, or None
+        if the driver cannot take element screenshots or returns an image
+        that is not the size of the element (e.g. a full page screenshot). In
+        those cases needle's `get_screenshot` falls back to cropping a full
+        page screenshot and should be used instead.
+
+        :param element: Web element to screenshot.
+        :rtype: bytes or None
+        """
+        from PIL import Image
 
-                if not os.path.exists(error_path):
-                    os.makedirs(error_path)
+        try:
+            png_bytes = element.screenshot_as_png
+            png_size = Image.open(BytesIO(png_bytes)).size
+        except (IOError, WebDriverException):
+            return None
 
-                error_file = '{}/{}--{}.png'.format(
-                    error_path,
-                    path,
-                    selector)
-                try:
-                    diff = ImageDiff(screenshot, baseline_screenshot)
-                except AssertionError:
-                    screenshot.save(error_file)
-                    raise AssertScreenshotException(error_file)
+        element_size = element.size
+        if png_size != (element_size['width'], element_size['height']):
+            return None
+        return png_bytes
+
+    @classmethod
+    def _load_baseline(cls, baseline_file, cache_prefix):
+        """
+        Return the baseline screenshot as a uint8 RGB array.
+
+        The decoded pixels are cached in a `.npy` file and memory mapped on
+        later runs, so the PNG is only decoded once. The cache file name is
+        `cache_prefix` plus the PNG's mtime and size, so any replaced PNG gets
+        a new cache, even one restored with an older mtime. Failing to write
+        the cache is not an error.
+
+        :param unicode baseline_file: Path to the baseline PNG.
+        :param unicode cache_prefix: Path prefix of the `.npy` pixel cache.
+        :return: Baseline pixels.
+        :rtype: numpy.ndarray
+        """
+        import numpy as np
+        from PIL import Image
+
+        try:
+            png_stat = os.stat(baseline_file)
+        except OSError:
+            raise MissingBaselineScreenshotException
+
+        cache_file = '{}.{:.6f}-{}.npy'.format(
+            cache_prefix, png_stat.st_mtime, png_stat.st_size)
+        try:
+            return np.load(cache_file, mmap_mode='r')
+        except (EOFError, IOError, OSError, ValueError):
+            # Missing or unreadable cache, rebuild it below.
+            pass
+
+        try:
+            baseline_array = np.asarray(
+                Image.open(baseline_file).convert('RGB'))
+        except IOError:
+            raise MissingBaselineScreenshotException
+
+        try:
+            cls._save_baseline_cache(cache_file, baseline_array)
+        except (IOError, OSError) as e:
+            log.warning('Could not write baseline cache {}: {}'.format(
+                cache_file, e))
+        else:
+            cls._remove_baseline_caches(cache_prefix, keep=cache_file)
+        return baseline_array
+
+    @staticmethod
+    def _remove_baseline_caches(cache_prefix, keep=None):
+        """
+        Remove the pixel caches of every version of a baseline PNG.
 
-                distance = abs(diff.get_distance())
-                if distance > self._THRESHOLD:
-                    screenshot.save(error_file)
-                    raise AssertScreenshotException(distance)
-            driver.close()
+        :param unicode cache_prefix: Path prefix of the `.npy` pixel cache.
+        :param unicode keep: Cache file to leave in place.
+        """
+        cache_dir, prefix = os.path.split(cache_prefix)
+        keep_name = os.path.basename(keep) if keep else None
+        try:
+            names = os.listdir(cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if (name == keep_name or not name.startswith(prefix) or
+                    not _CACHE_STAMP_RE.match(name[len(prefix):])):
+                continue
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _save_baseline_cache(cache_file, baseline_array):
+        """
+        Atomically write `baseline_array` to `cache_file`.
+
+        The array is written to a temporary file in the same directory and
+        renamed into place, so readers never see a partially written cache.
+
+        :param unicode cache_file: Path to the `.npy` pixel cache.
+        :param baseline_array: Baseline pixels.
+        """
+        import numpy as np
+
+        cache_dir = os.path.dirname(cache_file)
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # Another check may have created it concurrently.
+            if not os.path.isdir(cache_dir):
+                raise
+
+        fd, temp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, baseline_array)
+            os.rename(temp_file, cache_file)
+        except Exception:
+            os.remove(temp_file)
+            raise
+
+    @classmethod
+    def _get_distance(cls, a, b):
+        """
+        Return the distance in pixels between two images.
+
+        This is the sum of the absolute per channel differences divided by
+        `bands * 255`, the same units as needle's `ImageDiff.get_distance`, so
+        `_THRESHOLD` keeps its meaning.
+
+        The images are split into `_TILE_SIZE` square tiles and tiles that are
+        equal are skipped, so only the changed regions are summed.
+
+        :param a: uint8 RGB array of the first image.
+        :param b: uint8 RGB array of the second image, with the same shape as `a`.
+        :return: Distance between the images.
+        :rtype: float
+        """
+        import numpy as np
+
+        from stitching._diff_kernel import sad
+
+        size = cls._TILE_SIZE
+        height, width = a.shape[:2]
+        distance = 0
+        for y in range(0, height, size):
+            for x in range(0, width, size):
+                # Edge tiles are smaller rather than padded.
+                a_tile = a[y:y + size, x:x + size]
+                b_tile = b[y:y + size, x:x + size]
+                if not np.array_equal(a_tile, b_tile):
+                    distance += sad(a_tile.ravel(), b_tile.ravel())
+        return distance / (a.shape[2] * 255.0)
 
     @staticmethod
     def _make_chrome_options(browser_settings, display):
@@ -215,7 +542,7 @@ class SeleniumRegressionTestCase(unittest.TestCase):
             relevant display config section.
         :return: Selnium options object.
         """
-        options = import_module(browser_settings['options_module']).Options()
+        options = browser_settings['_options_cls']()
         for argument in browser_settings['arguments']:
             options.add_argument(argument)
 
@@ -230,17 +557,19 @@ class SeleniumRegressionTestCase(unittest.TestCase):
     @classmethod
     def _parse_selenium_config(cls, config):
         """
-        Parse and convert the selenium sections of the config file and store
-        the values in class variables.
+        Parse and convert the selenium sections of the config file.
 
         :param config: Config object.
         :type config: A SafeConfigParser instance.
+        :return: Selenium settings.
+        :rtype: dict
         """
-        cls._command_executor = config.get(
+        settings = {}
+        settings['command_executor'] = config.get(
             cls._SELENIUM_CONFIG_SECTION, 'command_executor')
-        cls._base_url = config.get(
+        settings['base_url'] = config.get(
             cls._SELENIUM_CONFIG_SECTION, 'base_url')
-        cls._screenshot_dir = config.get(
+        settings['screenshot_dir'] = config.get(
             cls._SELENIUM_CONFIG_SECTION,
             'screenshot_dir')
 
@@ -251,16 +580,17 @@ class SeleniumRegressionTestCase(unittest.TestCase):
             config.get(cls._SELENIUM_CONFIG_SECTION,
                        'browser_keys'))
 
-        cls._make_baseline_screenshots = asbool(
+        settings['make_baseline_screenshots'] = asbool(
             config.get(cls._SELENIUM_CONFIG_SECTION,
                        'make_baseline_screenshots'))
 
-        cls._make_browers(browser_keys, config)
-        cls._make_displays(display_keys, config)
+        settings['browsers'] = cls._make_browers(browser_keys, config)
+        settings['displays'] = cls._make_displays(display_keys, config)
+        return settings
 
     @classmethod
     def _make_browers(cls, browser_keys, config):
-        cls._browsers = {}
+        browsers = {}
         for browser_key in browser_keys:
             section_name = '{}:{}{}'.format(
                 cls._SELENIUM_CONFIG_SECTION,
@@ -270,11 +600,14 @@ class SeleniumRegressionTestCase(unittest.TestCase):
             section_dict = dict(config.items(section_name))
             section_dict['arguments'] = aslist(section_dict['arguments'])
             section_dict['mobile'] = asbool(section_dict['mobile'])
-            cls._browsers[browser_key] = section_dict
+            section_dict['_options_cls'] = import_module(
+                section_dict['options_module']).Options
+            browsers[browser_key] = section_dict
+        return browsers
 
     @classmethod
     def _make_displays(cls, display_keys, config):
-        cls._displays = {}
+        displays = {}
         for display_key in display_keys:
             section_name = '{}:{}{}'.format(
                 cls._SELENIUM_CONFIG_SECTION,
@@ -285,7 +618,8 @@ class SeleniumRegressionTestCase(unittest.TestCase):
             section_dict['width'] = int(section_dict['width'])
             section_dict['height'] = int(section_dict['height'])
             section_dict['pixel_ratio'] = float(section_dict['pixel_ratio'])
-            cls._displays[display_key] = section_dict
+            displays[display_key] = section_dict
+        return displays
 
     def _make_url(self, path):
         """
@@ -294,49 +628,42 @@ class SeleniumRegressionTestCase(unittest.TestCase):
         """
         return '{}/{}'.format(self._base_url, path)
 
-    def _make_screenshot_path(self, folder, browser_name, display_name):
+    @staticmethod
+    def _make_screenshot_path(screenshot_dir, folder, browser_name, display_name):
         """
         Generate a unicode path to be used for saving a screenshot.
 
+        :param unicode screenshot_dir: The root screenshot directory.
         :param unicode folder: The name of the folder to save to.
         :param unicode browser_name: The name of the browser in which the screenshot was taken in.
         :param unicode display_name: The name of the display in which the screenshot was taken in.
         :return: Path to directory to save the screen shot under.
         :rtype: Unicode
         """
-        return '/'.join((
-            self._screenshot_dir,
+        return os.path.join(
+            screenshot_dir,
             folder,
             browser_name,
-            display_name
-        ))
+            display_name)
 
-    def _yield_drivers(self):
+    @classmethod
+    def _yield_drivers(cls):
         """
         Yield a driver.
 
         This will yield one web driver for each combination of display and
         browser config section.
         """
-        displays_browsers = product(
-            self._displays.iteritems(),
-            self._browsers.iteritems())
-
-        for display, browser in displays_browsers:
-            display_name = display[0]
-            display_settings = display[1]
-            browser_name = browser[0]
-            browser_settings = browser[1]
-
-            if browser_name in ('chrome', 'chrome_mobile'):
-                options = self._make_chrome_options(
-                    browser_settings, display_settings)
-            else:
-                raise InvalidBrowserException(browser_name)
+        from needle.driver import NeedleRemote
+
+        for display_name, browser_name in cls._display_browser_pairs:
+            display_settings = cls._displays[display_name]
+            browser_settings = cls._browsers[browser_name]
 
             driver = NeedleRemote(
-                command_executor=self._command_executor,
-                desired_capabilities=options.to_capabilities())
+                command_executor=cls._command_executor,
+                desired_capabilities=cls._caps_cache[
+                    (display_name, browser_name)])
 
             if not browser_settings['mobile']:
                 driver.set_window_size(
@@ -0,0 +1,229 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+# Import the module rather than the class so the test runner does not collect
+# SeleniumRegressionTestCase itself.
+from stitching import base
+from stitching.exceptions import AssertScreenshotException, MissingBaselineScreenshotException
+
+
+class FakeElement(object):
+    def __init__(self, screenshot):
+        self._screenshot = screenshot
+
+    def is_displayed(self):
+        return True
+
+    def get_screenshot(self):
+        return self._screenshot
+
+
+class FakeDriver(object):
+    def __init__(self, screenshot):
+        self._element = FakeElement(screenshot)
+
+    def get(self, url):
+        pass
+
+    def find_element(self, by, value):
+        return self._element
+
+
+def _reference_distance(a, b):
+    return np.abs(a.astype(np.int64) - b).sum() / (a.shape[2] * 255.0)
+
+
+class GetDistanceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def _distance(self, a, b):
+        return base.SeleniumRegressionTestCase._get_distance(a, b)
+
+    def _random_image(self, height, width):
+        return self.random.randint(0, 256, (height, width, 3)).astype(np.uint8)
+
+    def test_identical_images(self):
+        a = self._random_image(150, 170)
+        self.assertEqual(self._distance(a, a.copy()), 0)
+
+    def test_distance_is_in_pixels(self):
+        a = np.zeros((10, 10, 3), dtype=np.uint8)
+        b = a.copy()
+        # One fully changed pixel is a distance of one.
+        b[3, 4] = 255
+        self.assertAlmostEqual(self._distance(a, b), 1.0)
+        # One channel of one pixel is a third of a pixel.
+        b[5, 5, 0] = 255
+        self.assertAlmostEqual(self._distance(a, b), 4 / 3.0)
+
+    def test_matches_reference_with_partial_tiles(self):
+        # Neither dimension is a multiple of _TILE_SIZE.
+        for height, width in ((150, 170), (64, 65), (1, 1), (200, 30)):
+            a = self._random_image(height, width)
+            b = self._random_image(height, width)
+            self.assertAlmostEqual(
+                self._distance(a, b), _reference_distance(a, b))
+
+    def test_difference_in_last_partial_tile(self):
+        a = self._random_image(150, 170)
+        b = a.copy()
+        b[149, 169, 2] ^= 0xff
+        self.assertAlmostEqual(
+            self._distance(a, b), _reference_distance(a, b))
+        self.assertGreater(self._distance(a, b), 0)
+
+
+class ThresholdTestCase(unittest.TestCase):
+    """
+    Check that _THRESHOLD is compared against the distance in pixels.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pixels = np.zeros((80, 90, 3), dtype=np.uint8)
+
+        class TestCase(base.SeleniumRegressionTestCase):
+            _THRESHOLD = 1.5
+            _base_url = 'http://localhost'
+            _make_baseline_screenshots = False
+            _screenshot_paths = {}
+
+        for folder in (TestCase._BASELINE_FOLDER_NAME,
+                       TestCase._CACHE_FOLDER_NAME,
+                       TestCase._ERROR_FOLDER_NAME):
+            path = os.path.join(self.tmp_dir, folder)
+            os.makedirs(path)
+            TestCase._screenshot_paths[(folder, 'browser', 'display')] = path
+
+        Image.fromarray(self.pixels).save(os.path.join(
+            TestCase._screenshot_paths[
+                (TestCase._BASELINE_FOLDER_NAME, 'browser', 'display')],
+            'page--.foo.png'))
+        self.test_case = TestCase('test_demo')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _check(self, changed_pixels):
+        screenshot = self.pixels.copy()
+        screenshot[0, :changed_pixels] = 255
+        self.test_case._check_one(
+            'display', 'browser', FakeDriver(Image.fromarray(screenshot)),
+            '.foo', ('css selector', '.foo'), 'page')
+
+    def test_within_threshold(self):
+        self._check(1)
+
+    def test_over_threshold(self):
+        with self.assertRaises(AssertScreenshotException):
+            self._check(2)
+
+
+class LoadBaselineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.baseline_file = os.path.join(self.tmp_dir, 'baseline.png')
+        self.cache_prefix = os.path.join(self.tmp_dir, 'cache', 'baseline.png')
+        random = np.random.RandomState(0)
+        self.pixels = random.randint(0, 256, (20, 30, 3)).astype(np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_png(self, pixels, mtime=None):
+        Image.fromarray(pixels).save(self.baseline_file)
+        if mtime is not None:
+            os.utime(self.baseline_file, (mtime, mtime))
+
+    def _cache_files(self):
+        cache_dir = os.path.dirname(self.cache_prefix)
+        return sorted(os.path.join(cache_dir, name)
+                      for name in os.listdir(cache_dir))
+
+    def _load(self):
+        return base.SeleniumRegressionTestCase._load_baseline(
+            self.baseline_file, self.cache_prefix)
+
+    def test_missing_png(self):
+        with self.assertRaises(MissingBaselineScreenshotException):
+            self._load()
+
+    def test_writes_and_reuses_cache(self):
+        self._write_png(self.pixels)
+        np.testing.assert_array_equal(self._load(), self.pixels)
+        self.assertEqual(len(self._cache_files()), 1)
+
+        loaded = self._load()
+        self.assertIsInstance(loaded, np.memmap)
+        np.testing.assert_array_equal(loaded, self.pixels)
+
+    def test_newer_png_rebuilds_cache(self):
+        self._write_png(self.pixels, mtime=1000000000)
+        self._load()
+
+        changed = 255 - self.pixels
+        self._write_png(changed, mtime=1000000100)
+        np.testing.assert_array_equal(self._load(), changed)
+        self.assertEqual(len(self._cache_files()), 1)
+
+    def test_older_png_rebuilds_cache(self):
+        # e.g. a baseline restored with rsync -a or tar x.
+        self._write_png(self.pixels, mtime=1000000100)
+        self._load()
+
+        changed = 255 - self.pixels
+        self._write_png(changed, mtime=1000000000)
+        np.testing.assert_array_equal(self._load(), changed)
+        self.assertEqual(len(self._cache_files()), 1)
+
+    def test_corrupt_cache_is_rebuilt(self):
+        self._write_png(self.pixels)
+        self._load()
+        cache_file, = self._cache_files()
+        with open(cache_file, 'wb') as f:
+            f.write(b'not a npy file')
+
+        np.testing.assert_array_equal(self._load(), self.pixels)
+        np.testing.assert_array_equal(np.load(cache_file), self.pixels)
+
+    def test_empty_cache_is_rebuilt(self):
+        self._write_png(self.pixels)
+        self._load()
+        cache_file, = self._cache_files()
+        open(cache_file, 'wb').close()
+
+        np.testing.assert_array_equal(self._load(), self.pixels)
+
+    def test_unwritable_cache_returns_pixels(self):
+        self._write_png(self.pixels)
+        # A file where the cache directory should be makes the write fail,
+        # even when running as root.
+        blocker = os.path.join(self.tmp_dir, 'blocker')
+        open(blocker, 'w').close()
+        self.cache_prefix = os.path.join(blocker, 'baseline.png')
+
+        np.testing.assert_array_equal(self._load(), self.pixels)
+
+    def test_save_baseline_cache_is_overridable(self):
+        calls = []
+
+        class TestCase(base.SeleniumRegressionTestCase):
+            @staticmethod
+            def _save_baseline_cache(cache_file, baseline_array):
+                calls.append(cache_file)
+
+        self._write_png(self.pixels)
+        TestCase._load_baseline(self.baseline_file, self.cache_prefix)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
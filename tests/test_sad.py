@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+import numpy as np
+
+from stitching import _diff_kernel
+
+try:
+    from stitching import _sad
+except ImportError:
+    _sad = None
+
+LENGTHS = (0, 1, 15, 16, 17, 31, 32, 33, 63, 64, 65, 1000, 12289)
+
+
+def _reference(a, b):
+    return int(np.abs(a.astype(np.int64) - b).sum())
+
+
+class SadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def _assert_matches_reference(self, sad):
+        for length in LENGTHS:
+            a = self.random.randint(0, 256, length).astype(np.uint8)
+            b = self.random.randint(0, 256, length).astype(np.uint8)
+            self.assertEqual(sad(a, b), _reference(a, b), length)
+
+    def _assert_extremes(self, sad):
+        a = np.zeros(65, dtype=np.uint8)
+        b = np.full(65, 255, dtype=np.uint8)
+        self.assertEqual(sad(a, b), 65 * 255)
+        self.assertEqual(sad(b, a), 65 * 255)
+        self.assertEqual(sad(b, b), 0)
+
+    def test_dispatched_sad(self):
+        self._assert_matches_reference(_diff_kernel.sad)
+        self._assert_extremes(_diff_kernel.sad)
+
+    def test_numpy_sad(self):
+        self._assert_matches_reference(_diff_kernel._sad_numpy)
+        self._assert_extremes(_diff_kernel._sad_numpy)
+
+    @unittest.skipIf(_sad is None, 'stitching._sad extension is not built')
+    def test_extension_sad(self):
+        self._assert_matches_reference(_sad.sad)
+        self._assert_extremes(_sad.sad)
+        self._assert_extremes(lambda a, b: _sad.sad(a.tobytes(), b.tobytes()))
+
+    @unittest.skipIf(_sad is None, 'stitching._sad extension is not built')
+    def test_extension_sad_size_mismatch(self):
+        with self.assertRaises(ValueError):
+            _sad.sad(b'a', b'ab')
+
+    @unittest.skipIf(
+        _sad is None or not hasattr(_sad, 'sad_sse2'),
+        'SSE2 kernel is not available')
+    def test_extension_sad_sse2(self):
+        self._assert_matches_reference(_sad.sad_sse2)
+        self._assert_extremes(_sad.sad_sse2)
+
+    @unittest.skipIf(
+        _sad is None or not getattr(_sad, 'HAVE_AVX2', 0),
+        'AVX2 kernel is not available')
+    def test_extension_sad_avx2(self):
+        self._assert_matches_reference(_sad.sad_avx2)
+        self._assert_extremes(_sad.sad_avx2)
+
+
+if __name__ == '__main__':
+    unittest.main()